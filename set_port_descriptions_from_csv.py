@@ -1,8 +1,15 @@
+import argparse
 import csv
-from collections import defaultdict
+import re
+from itertools import chain, groupby
+from operator import itemgetter
 from netmiko import ConnectHandler
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 import os
+import sys
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -14,156 +21,559 @@ CSV_FILE = "set_port_descriptions_from_csv.csv"
 # Resolve the directory where this script lives
 SCRIPT_DIR = Path(__file__).resolve().parent
 
-# 1) Try .env in the same folder as the script
-env_path = SCRIPT_DIR / ".env"
-
-# 2) If not found, try parent folder (This is in case you have a .env in the parent folder you share with multiple other scripts)
-if not env_path.exists():
-    env_path = SCRIPT_DIR.parent / ".env"
+# Look for .env in this order and use the first one that exists:
+# 1) the same folder as the script
+# 2) the parent folder (This is in case you have a .env in the parent folder you share with multiple other scripts)
+env_path = next(
+    (p for p in (SCRIPT_DIR / ".env", SCRIPT_DIR.parent / ".env") if p.is_file()),
+    None,
+)
 
 # Load if found (silent if missing)
-load_dotenv(env_path)
-
-# Loads credentials from .env
-USERNAME = os.environ.get("NET_USER")
-PASSWORD = os.environ.get("NET_PASS")
-SECRET   = os.environ.get("NET_SECRET")
-
-# In case of failure
+if env_path:
+    load_dotenv(env_path)
+
+# Loads credentials from .env (NET_SECRET is optional)
+try:
+    USERNAME = os.environ["NET_USER"]
+    PASSWORD = os.environ["NET_PASS"]
+except KeyError as missing:
+    raise SystemExit(f"Missing {missing.args[0]}. Create a .env file")
+SECRET   = os.environ.get("NET_SECRET", "")
+
+# In case they are set but empty
 if not USERNAME or not PASSWORD:
     raise SystemExit("Missing NET_USER or NET_PASS. Create a .env file")
 
-# How many switches to work on in parallel
-threads = 10
-
-# Dictionary that will map:
-#   host_ip -> list of (interface, description) for that host
-#
-# defaultdict(list) means:
-# - If you access devices_interfaces[some_host] and it doesn't exist yet,
-#   it automatically creates an empty list instead of raising a KeyError.
-# This is so devices_interfaces[host].append((iface, desc))
-#   Look for key host
-#   If it doesn’t exist → create []
-#   Append (iface, desc) to that list
-# This removes the need for the next line
-#    if host not in devices_interfaces:
-#        devices_interfaces[host] = []
-
-
-devices_interfaces = defaultdict(list)
-
-# ---- 1) Load data from CSV ----
-with open(CSV_FILE, newline="") as f:
-    # DictReader reads each row into a dict using the header line as keys
-    # e.g. row = {"host": "10.0.0.1", "interface": "Gi1/0/1", "description": "Test"}
-    reader = csv.DictReader(f)
-    for row in reader:
-        # Extract and clean each field
-        host = row["host"].strip()
-        iface = row["interface"].strip()
-        desc = row["description"].strip()
-
-        # Skip any incomplete/bad rows
-        if not host or not iface or not desc:
-            continue
-
-        # Append the (interface, description) pair to this host's list
-        # After reading the whole CSV, devices_interfaces might look like:
-        # {
-        #   "10.0.0.1": [("Gi1/0/1", "Test1"), ("Gi1/0/2", "Test2")],
-        #   "10.0.0.2": [("Gi1/0/3", "Test3")]
-        # }
-        devices_interfaces[host].append((iface, desc))
-
-# If the CSV produced no usable rows, abort the script
-if not devices_interfaces:
-    raise SystemExit("No valid rows found in CSV. Check file contents.")
-
-
-def configure_switch(host, entries):
+# Netmiko device type of every switch in the CSV (see FAMILIES below)
+DEVICE_TYPE = os.environ.get("NET_DEVICE_TYPE", "cisco_ios").strip()
+
+# Netmiko settings shared by every switch; only "host" differs per switch
+DEVICE_TEMPLATE = {
+    "device_type": DEVICE_TYPE,
+    "username": USERNAME,
+    "password": PASSWORD,
+    "secret": SECRET,
+    # Netmiko speed knob: with Netmiko's default fast_cli=True, internal
+    # waits use the smaller of the per-call and global delay factors, so a
+    # global delay factor of 0.1 cuts the pause between config lines from
+    # 50 ms to 5 ms
+    "global_delay_factor": 0.1,
+}
+
+# Splits an interface name into its type and its number
+# e.g. "Gi1/0/1" -> ("Gi", "1/0/1")
+IFACE_ID_RE = re.compile(r"^([A-Za-z-]+)\s*(\d.*)$")
+
+# Interface types the switch may print or the CSV may use:
+#   full name (lowercase) -> the short name the switch prints
+# Used so "GigabitEthernet1/0/1", "Gig1/0/1" and "Gi1/0/1" all compare equal,
+# while similar types such as TwoGigabitEthernet ("Tw") and
+# TwentyFiveGigE ("Twe") stay different.
+IFACE_TYPES = {
+    "fastethernet": "fa",
+    "gigabitethernet": "gi",
+    "twogigabitethernet": "tw",
+    "fivegigabitethernet": "fi",
+    "tengigabitethernet": "te",
+    "twentyfivegige": "twe",
+    "fortygigabitethernet": "fo",
+    "hundredgige": "hu",
+    "appgigabitethernet": "ap",
+    "ethernet": "eth",
+    "port-channel": "po",
+    "vlan": "vl",
+    "loopback": "lo",
+    "tunnel": "tu",
+    "mgmt": "mgmt",
+}
+
+# Splits an interface name into runs of digits and non-digits
+# e.g. "gi1/0/24" -> ["gi", "1", "/", "0", "/", "24"]
+IFACE_TOKEN_RE = re.compile(r"\d+|\D+")
+
+# Splits an interface name into everything before the port number and
+# the port number itself
+# e.g. "Gi1/0/24" -> ("Gi1/0/", "24")
+IFACE_PORT_RE = re.compile(r"^(.*?)(\d+)$")
+
+# Interface types (short names from IFACE_TYPES) that "interface range"
+# accepts. Anything else (Vlan, Loopback, Tunnel, subinterfaces, ...) is
+# always configured one interface at a time.
+RANGE_IFACE_TYPES = {"fa", "gi", "te", "tw", "twe", "fo", "hu", "eth", "po"}
+
+# Matches every non-blank line of "show interface description" except the
+# "Interface  Status  Protocol  Description" header, and captures the
+# interface name at the start of the line
+VERIFY_LINE_RE = re.compile(r"(?im)^(?![ \t]*interface\b)[ \t]*(\S+).*$")
+
+# Matches an IOS error reply in config or show command output
+# e.g. "% Invalid input detected at '^' marker."
+CONFIG_ERROR_RE = re.compile(r"(?m)^[ \t]*% .*$")
+
+# Matches the config-mode prompt echoed in front of each config line
+# e.g. "SW1(config)#" or "SW1(config-if-range)#"
+CONFIG_PROMPT_RE = re.compile(r"^\S*\(config[^)]*\)#")
+
+# Above this many config lines, push without waiting for each line's echo.
+# Echo checking costs one round-trip per line; skipping it costs a fixed
+# ~2 s wait at the end, so the break-even is about 2 s / RTT lines
+# (40 lines at a 50 ms round-trip).
+CMD_VERIFY_MAX_LINES = 40
+
+# Seconds to wait for a "show running-config" / "show startup-config"
+# snapshot; large configs take much longer than Netmiko's default 10 s
+SNAPSHOT_READ_TIMEOUT = 120
+
+# Reuse SSH sessions across configure_switch() calls (off by default).
+# Only used when another program imports this module and calls
+# configure_switch() repeatedly; running the script itself never pools,
+# since it connects to each switch once anyway.
+CONNECTION_POOL_ENABLED = os.environ.get(
+    "CONNECTION_POOL_ENABLED", ""
+).strip().lower() in ("1", "true", "yes")
+
+# Pooled sessions idle for longer than this (seconds) are reconnected
+POOL_MAX_IDLE = 300
+
+
+@lru_cache(maxsize=None)
+def _iface_type(prefix):
+    # Turns any spelling of an interface type into its short name
+    # e.g. "GigabitEthernet" -> "gi", "Gig" -> "gi", "Gi" -> "gi",
+    #      "Tw" -> "tw", "Twe" -> "twe", "TwentyFiveGigE" -> "twe"
+    prefix = prefix.lower()
+
+    # Already the short name the switch prints, or the full name
+    if prefix in IFACE_TYPES.values():
+        return prefix
+    if prefix in IFACE_TYPES:
+        return IFACE_TYPES[prefix]
+
+    # Any other abbreviation, as long as it matches exactly one type
+    # (the same rule the switch CLI uses)
+    matches = {short for full, short in IFACE_TYPES.items() if full.startswith(prefix)}
+    if len(matches) == 1:
+        return matches.pop()
+
+    # Unknown type → compare it as written
+    return prefix
+
+
+def _iface_id(name):
+    # Normalizes an interface name so long and short forms compare equal
+    # e.g. "GigabitEthernet1/0/1" -> "gi1/0/1" and "Gi1/0/1" -> "gi1/0/1"
+    match = IFACE_ID_RE.match(name)
+    if not match:
+        return name.lower()
+    prefix, number = match.groups()
+    return _iface_type(prefix) + number
+
+
+def _iface_key(name):
+    # Sort key that orders interfaces the way the switch does
+    # e.g. "Gi1/0/2" sorts before "Gi1/0/10" (plain text sorting would not)
+    #   "Gi1/0/24" -> ((1, "gi"), (0, 1), (1, "/"), (0, 0), (1, "/"), (0, 24))
+    # Each token is tagged so numbers and text are never compared directly
+    return tuple(
+        (0, int(token)) if token.isdigit() else (1, token)
+        for token in IFACE_TOKEN_RE.findall(_iface_id(name))
+    )
+
+
+def _can_range(stem):
+    # True if ports on this stem (everything before the port number,
+    # e.g. "Gi1/0/") may be grouped into an "interface range":
+    # a range-capable type, followed by a module/slot ending in "/".
+    # "Vlan" (no slot) and "Gi0/0." (subinterface) do not qualify.
+    match = IFACE_ID_RE.match(stem)
+    return (
+        match is not None
+        and stem.endswith("/")
+        and _iface_type(match.group(1)) in RANGE_IFACE_TYPES
+    )
+
+
+def _iface_ranges(entries):
+    # Groups runs of adjacent ports that get the same description, so one
+    # "interface range" command can replace several "interface" commands.
+    # entries must already be in port order (see the CSV sort below).
+    #
+    # Returns a list of (first interface, last port or None, description), e.g.
+    #   [("Gi1/0/1", "AP"), ("Gi1/0/2", "AP"), ("Gi1/0/3", "AP"), ("Gi1/0/5", "PC")]
+    #   -> [("Gi1/0/1", 3, "AP"), ("Gi1/0/5", None, "PC")]
+    ranges = []
+
+    # The run currently being built: first interface, its stem, the first
+    # and last port number, and the shared description
+    first = stem = desc = None
+    start = last = 0
+
+    for iface, iface_desc in entries:
+        match = IFACE_PORT_RE.match(iface)
+        # Interfaces that cannot be part of a range are treated like names
+        # without a port number
+        if match and not _can_range(match.group(1)):
+            match = None
+        if match:
+            iface_stem, port = _iface_id(match.group(1)), int(match.group(2))
+            # Same module/slot, next port number and same description
+            # → extend the current run
+            if (
+                first is not None
+                and iface_stem == stem
+                and port == last + 1
+                and iface_desc == desc
+            ):
+                last = port
+                continue
+
+        # Close the current run before starting a new one
+        if first is not None:
+            ranges.append((first, None if start == last else last, desc))
+            first = None
+
+        if match:
+            first, stem, desc = iface, iface_stem, iface_desc
+            start = last = port
+        else:
+            # No module/slot port number → can never be part of a range
+            ranges.append((iface, None, iface_desc))
+
+    if first is not None:
+        ranges.append((first, None if start == last else last, desc))
+
+    return ranges
+
+
+class CiscoIosOps:
+    # Everything that depends on the device family: which commands to send
+    # and how to read the output. One of these is picked once at startup
+    # (see OPS below), so configure_switch() never checks the device type.
+    #
+    # Saving is not here: Netmiko's save_config() already sends the right
+    # command for each device_type ("write mem", "copy run start", ...).
+
+    # Shows only the interface and description lines of a config;
+    # {config} is "running-config" or "startup-config".
+    # The two are compared after the push to decide whether a save is needed.
+    desc_snapshot_cmd = "show {config} | include ^interface|^ description"
+
+    # Lists every interface with its description in one command
+    verify_cmd = "show interface description"
+
+    @staticmethod
+    def clean_snapshot(output):
+        # Removes anything from a desc_snapshot_cmd output that changes
+        # between two runs of the command even when the config did not.
+        # The IOS include filter already keeps only the config lines.
+        return output
+
+    @staticmethod
+    def interface_cmd(first, last):
+        # "interface Gi1/0/1" or "interface range Gi1/0/1 - 4"
+        if last is None:
+            return f"interface {first}"
+        return f"interface range {first} - {last}"
+
+    @staticmethod
+    def desc_cmd(desc):
+        # A description of None means the CSV said "blank",
+        # so the description is removed instead
+        return "no description" if desc is None else f"description {desc}"
+
+    def build_commands(self, entries):
+        # Turns (interface, description) pairs into config lines, e.g.
+        #   [("Gi1/0/1", "AP"), ("Gi1/0/2", "AP"), ("Gi1/0/5", "Printer-02")]
+        #
+        # becomes (adjacent ports with the same description are configured
+        # together with "interface range"):
+        #   interface range Gi1/0/1 - 2
+        #   description AP
+        #   interface Gi1/0/5
+        #   description Printer-02
+        return list(chain.from_iterable(
+            (self.interface_cmd(first, last), self.desc_cmd(desc))
+            for first, last, desc in _iface_ranges(entries)
+        ))
+
+    @staticmethod
+    def parse_verify(output, entries):
+        # Keeps only the verify_cmd output lines for the interfaces we changed
+        # (one regex scan over the whole output; the header line and
+        # blank lines never match).
+        #
+        # Names are normalized so "GigabitEthernet1/0/1" in the CSV matches
+        # the "Gi1/0/1" the switch prints
+        #
+        # Interfaces the switch did not list at all (e.g. a typo in the CSV)
+        # get a "not found on switch" line instead of silently disappearing
+        wanted = {_iface_id(iface): iface for iface, _ in entries}
+        lines = []
+        found = set()
+        for m in VERIFY_LINE_RE.finditer(output):
+            iface_id = _iface_id(m.group(1))
+            if iface_id in wanted:
+                lines.append(m.group(0))
+                found.add(iface_id)
+
+        lines.extend(
+            f"{iface}: not found on switch"
+            for iface_id, iface in wanted.items()
+            if iface_id not in found
+        )
+        return lines
+
+
+class CiscoNxosOps(CiscoIosOps):
+    # Cisco NX-OS differences from IOS
+
+    # NX-OS indents interface lines differently, so compare the whole
+    # interface section of the config instead
+    desc_snapshot_cmd = "show {config} interface"
+
+    @staticmethod
+    def clean_snapshot(output):
+        # NX-OS starts the output with comment lines such as
+        #   !Command: show running-config interface
+        #   !Time: <now>
+        # which differ between running and startup (and on every run).
+        # Drop every "!" line (and blank lines) so only the config itself
+        # is compared.
+        return "\n".join(
+            line for line in output.splitlines()
+            if line.strip() and not line.lstrip().startswith("!")
+        )
+
+    @staticmethod
+    def interface_cmd(first, last):
+        # "interface Eth1/1" or "interface Eth1/1-4"
+        if last is None:
+            return f"interface {first}"
+        return f"interface {first}-{last}"
+
+
+# Supported Netmiko device types and the commands each one uses
+FAMILIES = {
+    "cisco_ios": CiscoIosOps(),
+    "cisco_xe": CiscoIosOps(),
+    "cisco_nxos": CiscoNxosOps(),
+}
+
+# Pick the device family once, for the whole run
+try:
+    OPS = FAMILIES[DEVICE_TYPE]
+except KeyError:
+    raise SystemExit(
+        f"Unsupported NET_DEVICE_TYPE {DEVICE_TYPE!r}. Use one of: {', '.join(FAMILIES)}"
+    )
+
+
+class ConnectionPool:
+    # Keeps SSH sessions open between configure_switch() calls so a
+    # long-running process (REPL, scheduler, orchestrator) does not pay the
+    # SSH handshake + login + terminal setup again for a switch it already
+    # talked to.
+    #
+    # When disabled, acquire() simply opens a new connection and release()
+    # closes it, which is exactly the one-shot behaviour of this script.
+
+    def __init__(self, enabled, max_idle=POOL_MAX_IDLE):
+        self.enabled = enabled
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        # key -> (connection, time it was last released)
+        self._pool = {}
+
+    @staticmethod
+    def _key(device):
+        return (
+            device["host"],
+            device["username"],
+            device.get("port", 22),
+            device["device_type"],
+        )
+
+    @staticmethod
+    def _alive(conn):
+        # Cheap health probe: a dead session fails to return a prompt
+        try:
+            conn.find_prompt()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, device):
+        # Returns a connected Netmiko session for this device
+        if self.enabled:
+            # pop() so two threads never share the same session
+            with self._lock:
+                entry = self._pool.pop(self._key(device), None)
+
+            if entry:
+                conn, last_used = entry
+                idle = time.monotonic() - last_used
+                if idle <= self.max_idle and self._alive(conn):
+                    return conn
+                # Too old or broken → throw it away and reconnect
+                self.discard(conn)
+
+        return ConnectHandler(**device)
+
+    def release(self, device, conn):
+        # Hands a healthy session back to the pool (or closes it)
+        if not self.enabled:
+            conn.disconnect()
+            return
+
+        with self._lock:
+            previous = self._pool.pop(self._key(device), None)
+            self._pool[self._key(device)] = (conn, time.monotonic())
+
+        # Only one idle session is kept per device
+        if previous:
+            self.discard(previous[0])
+
+    @staticmethod
+    def discard(conn):
+        # Closes a session that must not be reused
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    def close_all(self):
+        # Closes every idle session (call once when the process is done)
+        with self._lock:
+            entries = list(self._pool.values())
+            self._pool.clear()
+        for conn, _ in entries:
+            self.discard(conn)
+
+
+# One pool shared by every worker thread
+POOL = ConnectionPool(CONNECTION_POOL_ENABLED)
+
+
+def configure_switch(host, entries, pool=POOL):
     # Connects to a single switch, applies all interface descriptions for that
     # switch, saves the configuration, and verifies the result.
     # This function runs inside a thread.
     # It returns a single text block to be printed by the main thread.
+    #
+    # By default sessions come from the shared POOL, so code that imports
+    # this module and calls configure_switch() repeatedly can reuse them.
     
     # Netmiko device definition for this switch
-    device = {
-        "device_type": "cisco_ios",
-        "host": host,
-        "username": USERNAME,
-        "password": PASSWORD,
-        "secret": SECRET,
-    }
+    # (the shared settings plus this switch's address)
+    device = {**DEVICE_TEMPLATE, "host": host}
 
-   # Initialize connection variable so `finally` can safely close it
+   # Initialize connection variable so `finally` can safely release it
     conn = None
 
     try:
-        # Open SSH connection to the device
-        conn = ConnectHandler(**device)
+        # Open SSH connection to the device (or reuse a pooled one)
+        conn = pool.acquire(device)
 
         # Only attempts enable when a secret exists
         if SECRET:
             conn.enable()
 
+        # Read the exec prompt (e.g. "SW1#") once and tell every show
+        # command below to wait for it. Without expect_string Netmiko sends
+        # an extra newline and reads the prompt again before each command.
+        prompt = re.escape(conn.find_prompt())
+
         # Build configuration commands
-        #
-        # entries example:
-        #   [("Gi1/0/1", "PC-01"), ("Gi1/0/2", "Printer-02")]
-        #
-        # Resulting command list:
-        #   interface Gi1/0/1
-        #   description PC-01
-        #   interface Gi1/0/2
-        #   description Printer-02
-        
-        config_cmds = []
-        for iface, desc in entries:
-            config_cmds.append(f"interface {iface}")
-
-    # If CSV says "blank" (case-insensitive), remove the description
-            if desc.strip().lower() == "blank":
-                config_cmds.append("no description")
-            else:
-                config_cmds.append(f"description {desc}")
+        # (see build_commands() for what the list looks like)
+        config_cmds = OPS.build_commands(entries)
 
         # Push all configuration in one batch
         # Netmiko handles entering/exiting config mode internally
-        conn.send_config_set(config_cmds)
+        #
+        # Short pushes (the usual case once ports are merged into ranges):
+        # wait for each line's echo, one network round-trip per line, and
+        # let Netmiko stop at the first error line.
+        #
+        # Long pushes: cmd_verify=False writes every line straight away and
+        # reads the output once at the end. That final read waits for ~2 s
+        # of silence, so it only pays off above CMD_VERIFY_MAX_LINES.
+        if len(config_cmds) <= CMD_VERIFY_MAX_LINES:
+            config_output = conn.send_config_set(
+                config_cmds, error_pattern=CONFIG_ERROR_RE.pattern
+            )
+        else:
+            config_output = conn.send_config_set(config_cmds, cmd_verify=False)
+
+        # On the long path a rejected line does not stop the push.
+        # A rejected "interface ..." line is the dangerous one:
+        # the next "description" would land on the previous interface.
+        # So any IOS error message fails the switch (nothing is saved).
+        error = CONFIG_ERROR_RE.search(config_output)
+        if error:
+            # The rejected line is the last echoed line before the error
+            # (skipping the "^" marker line under it,
+            # and without the "SW(config)#" prompt in front of it)
+            echoed = [
+                CONFIG_PROMPT_RE.sub("", line).strip()
+                for line in config_output[:error.start()].splitlines()
+                if line.strip() and line.strip() != "^"
+            ]
+            rejected = echoed[-1] if echoed else "?"
+            raise ValueError(
+                f"switch rejected config line {rejected!r}: {error.group(0).strip()}"
+            )
         # Netmiko internally does
         # conf t
         # interface Gi1/0/1
         # description Test1
 
-        # Save running-config to startup-config (write memory)
-        conn.save_config()
+        # Save running-config to startup-config (write memory), but only if
+        # the saved config is missing something: on older switches the save
+        # is the slowest step of the whole run (several seconds).
+        #
+        # Comparing running against startup (rather than running before and
+        # after the push) also catches an earlier run whose save failed.
+        running = conn.send_command(
+            OPS.desc_snapshot_cmd.format(config="running-config"),
+            expect_string=prompt,
+            read_timeout=SNAPSHOT_READ_TIMEOUT,
+            use_textfsm=False
+        )
+        startup = conn.send_command(
+            OPS.desc_snapshot_cmd.format(config="startup-config"),
+            expect_string=prompt,
+            read_timeout=SNAPSHOT_READ_TIMEOUT,
+            use_textfsm=False
+        )
+        # If either show command was refused (e.g. "% Invalid input" from a
+        # missing privilege or an unsupported filter), the two error replies
+        # could match each other, so treat that as "save needed"
+        snapshot_failed = any(
+            CONFIG_ERROR_RE.search(snapshot) for snapshot in (running, startup)
+        )
+        changed = snapshot_failed or (
+            OPS.clean_snapshot(running) != OPS.clean_snapshot(startup)
+        )
+        if changed:
+            conn.save_config()
 
         # Build ONE output block
         out_lines = []
         out_lines.append(f">>> Verifying interface descriptions on {host}:")
+        if not changed:
+            out_lines.append(">>> startup-config already up to date, config not saved")
 
-        for iface, _ in entries:
-            # Run verification command per interface
-            output = conn.send_command(
-                f"show interface {iface} description",
-                use_textfsm=False
-            ).strip()
-
-            # Drop header lines and blanks, keep only the real interface line(s)
-            for line in output.splitlines():
-                line_stripped = line.strip()
-
-                # Skip empty lines
-                if not line_stripped:
-                    continue
-
-                # Skip the header line (starts with "Interface")
-                if line_stripped.lower().startswith("interface"):
-                    continue
+        # Run ONE verification command for the whole switch instead of one
+        # per interface (each command is a full network round-trip)
+        output = conn.send_command(
+            OPS.verify_cmd,
+            expect_string=prompt,
+            use_textfsm=False
+        ).strip()
 
-                # Keep only the actual interface description line
-                out_lines.append(line)
+        # Keep only the lines for the interfaces we changed
+        out_lines.extend(OPS.parse_verify(output, entries))
 
         # Join all verification lines into one printable block
         verify_block = "\n".join(out_lines)                
@@ -175,62 +585,207 @@ def configure_switch(host, entries):
         return True, host, verify_block
     
     except Exception as e:
+        # A session that failed mid-change may be in a bad state
+        # (e.g. stuck in config mode), so never hand it back to the pool
+        if conn:
+            pool.discard(conn)
+            conn = None
+
         # Failure return (error text instead of printed output)
         return False, host, f"XXX ERROR on {host}: {e}"
     
     finally:
-        # Always close the connection if it was opened
+        # Always release the connection if it was opened
+        # (closes it, or keeps it open for reuse when pooling is enabled)
         if conn:
-            conn.disconnect()
+            pool.release(device, conn)
 
 
-# ---- 2) Thread pool execution ----
-# results structure:
-#   {
-#     "10.0.0.1": (True,  "<verification text>"),
-#     "10.0.0.2": (False, "<error text>")
-#   }
-results = {}
-
-with ThreadPoolExecutor(max_workers=threads) as executor:
-    # Submit one task per switch
-    # Each task runs configure_switch(host, entries)
-    futures = {
-        executor.submit(configure_switch, host, entries): host
-        for host, entries in devices_interfaces.items()
+def format_block(ok, host, text):
+    # The full verification or error block,
+    # plus the success line only for successful hosts,
+    # plus a blank line between hosts
+    if ok:
+        text += f"\n>>> SUCCESS: {host}"
+    return f"{text}\n\n"
+
+
+def load_csv(csv_file):
+    # Reads the CSV and returns the interfaces to change, grouped per host
+    # (see the devices_interfaces example below)
+
+    # Every usable CSV row as (host, interface, description)
+    # description is None when the CSV asks for it to be removed
+    rows = []
+
+    with open(csv_file, newline="") as f:
+        # csv.reader returns each row as a plain list of strings
+        # e.g. row = ["10.0.0.1", "Gi1/0/1", "Test"]
+        reader = csv.reader(f)
+
+        # Find the column position of each field once, from the header line
+        header = [name.strip() for name in next(reader, [])]
+        try:
+            idx_h = header.index("host")
+            idx_i = header.index("interface")
+            idx_d = header.index("description")
+        except ValueError:
+            raise SystemExit("CSV must have the headers: host,interface,description")
+
+        # Rows shorter than this are missing at least one of our columns
+        min_len = max(idx_h, idx_i, idx_d) + 1
+
+        for row in reader:
+            # Skip short rows (e.g. blank lines or missing trailing columns)
+            if len(row) < min_len:
+                continue
+
+            # Extract and clean each field
+            host = row[idx_h].strip()
+            iface = row[idx_i].strip()
+            desc = row[idx_d].strip()
+
+            # Skip any incomplete/bad rows
+            if not host or not iface or not desc:
+                continue
+
+            # If CSV says "blank" (case-insensitive), store None so the
+            # description gets removed ("no description")
+            if desc.casefold() == "blank":
+                desc = None
+
+            rows.append((host, iface, desc))
+
+    # Sort once by host, then by interface in natural port order, so every
+    # switch receives its commands in the same order it lists its ports.
+    # sort() is stable: if an interface appears twice, the later CSV row is
+    # still applied last, exactly like before.
+    rows.sort(key=lambda r: (r[0], _iface_key(r[1])))
+
+    # Dictionary that maps:
+    #   host_ip -> list of (interface, description) for that host
+    #
+    # groupby() walks the sorted rows and yields one group per host, e.g.
+    # {
+    #   "10.0.0.1": [("Gi1/0/1", "Test1"), ("Gi1/0/2", "Test2")],
+    #   "10.0.0.2": [("Gi1/0/3", "Test3")]
+    # }
+    devices_interfaces = {
+        host: [(iface, desc) for _, iface, desc in group]
+        for host, group in groupby(rows, key=itemgetter(0))
     }
-    # as_completed() yields futures as they finish (order is non-deterministic)
-    for future in as_completed(futures):
-        # Unpack the returned tuple from configure_switch()
-        ok, host, text = future.result()
-        # Store result keyed by host for later ordered printing
-        results[host] = (ok, text)
 
-# ---- 3) Print grouped output ----
-for host in sorted(results):
-    ok, text = results[host]
+    # If the CSV produced no usable rows, abort the script
+    if not devices_interfaces:
+        raise SystemExit("No valid rows found in CSV. Check file contents.")
 
-    # Print the full verification or error block
-    print(text)
+    return devices_interfaces
 
-    # Print success line only for successful hosts
-    if ok:
-        print(f">>> SUCCESS: {host}")
-    print()  # Blank line between hosts
 
-# ---- 4) Summary ----
-# Extract hostnames based on success/failure
-successes = [h for h, (ok, _) in results.items() if ok]
-failures  = [h for h, (ok, _) in results.items() if not ok]
+def parse_args():
+    # Command-line options
+    # By default each switch's block is printed as soon as that switch is done,
+    # so one slow switch does not hold back everyone else's output.
+    # With --sorted, blocks are held back and printed in host order at the end.
+    parser = argparse.ArgumentParser(description="Set Cisco interface descriptions from a CSV file.")
+    parser.add_argument(
+        "--sorted",
+        action="store_true",
+        help="print per-switch output in host order once all switches are done",
+    )
+    return parser.parse_args()
+
+
+def main():
+    # Runs the whole job: load the CSV, configure every switch in parallel,
+    # print each switch's result and a summary.
+    args = parse_args()
+
+    # ---- 1) Load data from CSV ----
+    devices_interfaces = load_csv(CSV_FILE)
+
+    # How many switches to work on in parallel
+    #
+    # Workers spend almost all their time waiting on the network, so running
+    # many more of them than there are CPU cores is fine. By default use one
+    # per switch, up to 64; set NET_PARALLELISM to override.
+    try:
+        threads = int(os.environ.get("NET_PARALLELISM", min(len(devices_interfaces), 64)))
+    except ValueError:
+        raise SystemExit("NET_PARALLELISM must be a whole number")
+
+    if threads < 1:
+        raise SystemExit("NET_PARALLELISM must be at least 1")
+
+    # A single run connects to each switch exactly once, so there is
+    # nothing to reuse: sessions are closed as soon as a switch is done,
+    # even when CONNECTION_POOL_ENABLED is set
+    pool = ConnectionPool(enabled=False)
+
+    # ---- 2) Thread pool execution ----
+    # Only the summary counters are kept, not every host's output
+    # (held blocks are only kept when --sorted is used)
+    total = 0
+    failures = []
+    held_blocks = {}
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="netcfg") as executor:
+        # Submit one task per switch
+        # Each task runs configure_switch(host, entries)
+        #
+        # Switches with the most interfaces are submitted first, so the longest
+        # jobs start right away and overlap with the many short ones instead of
+        # being left running alone at the end of the run
+        #
+        # A plain list is enough: configure_switch() already returns the host,
+        # so there is no need to map each future back to its host
+        futures = [
+            executor.submit(configure_switch, host, entries, pool)
+            for host, entries in sorted(
+                devices_interfaces.items(),
+                key=lambda item: len(item[1]),
+                reverse=True,
+            )
+        ]
+        # as_completed() yields futures as they finish (order is non-deterministic)
+        # Only this main thread writes to stdout, so blocks never interleave
+        for future in as_completed(futures):
+            # Unpack the returned tuple from configure_switch()
+            ok, host, text = future.result()
+
+            total += 1
+            if not ok:
+                failures.append(host)
+
+            block = format_block(ok, host, text)
+            if args.sorted:
+                held_blocks[host] = block
+            else:
+                sys.stdout.write(block)
+                sys.stdout.flush()
+
+    # ---- 3) Print held output (--sorted only) ----
+    if held_blocks:
+        sys.stdout.write("".join(held_blocks[host] for host in sorted(held_blocks)))
+        failures.sort()
+
+    # ---- 4) Summary ----
+    summary = [
+        "\n========== SUMMARY ==========",
+        f"Total switches:  {total}",
+        f"Successful:      {total - len(failures)}",
+        f"Failed:          {len(failures)}",
+    ]
+
+    if failures:
+        summary.append("\nFailed hosts:")
+        summary.extend(f" - {h}" for h in failures)
+
+    summary.append("\nDone.")
 
-print("\n========== SUMMARY ==========")
-print(f"Total switches:  {len(results)}")
-print(f"Successful:      {len(successes)}")
-print(f"Failed:          {len(failures)}")
+    sys.stdout.write("\n".join(summary) + "\n")
+    sys.stdout.flush()
 
-if failures:
-    print("\nFailed hosts:")
-    for h in failures:
-        print(" -", h)
 
-print("\nDone.")
+if __name__ == "__main__":
+    main()